@@ -0,0 +1,46 @@
+import multiprocessing
+from pathlib import Path
+
+from yuca.app_data import AppData
+from yuca.data_handlers import load_yaml
+
+PROCESSES = 16
+WAREHOUSES_PER_PROCESS = 5
+
+
+def _register_warehouses(root: str, worker: int):
+    for i in range(WAREHOUSES_PER_PROCESS):
+        warehouse = Path(root) / f"wh-{worker}-{i}"
+        warehouse.mkdir()
+        AppData.add_warehouse(warehouse)
+        AppData.switch_to_warehouse(warehouse)
+        assert AppData.active_warehouse() in AppData.get_warehouses()
+
+
+def test_concurrent_processes_keep_every_warehouse(tmp_path, monkeypatch):
+    # Spawned processes inherit the environment, so all of them share the app
+    # data file in the temporary folder
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    warehouses_root = tmp_path / "warehouses"
+    warehouses_root.mkdir()
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_register_warehouses, args=(str(warehouses_root), i))
+        for i in range(PROCESSES)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(timeout=120)
+    assert [proc.exitcode for proc in procs] == [0] * PROCESSES
+
+    data = load_yaml(str(tmp_path / "data" / "yuca" / "data.yml"))
+    expected = {
+        str(warehouses_root / f"wh-{worker}-{i}")
+        for worker in range(PROCESSES)
+        for i in range(WAREHOUSES_PER_PROCESS)
+    }
+    assert len(data["warehouses"]) == len(expected)
+    assert set(data["warehouses"]) == expected
+    assert 0 <= data["active_wh"] < len(expected)
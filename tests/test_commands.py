@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from yuca.commands import (
+    CACHED,
+    FAILED,
+    OK,
+    SKIPPED,
+    TIMEOUT,
+    _store_in_cache,
+    parse_jobs,
+    report,
+    run_jobs,
+)
+
+
+def test_plain_commands_run_in_sequence():
+    jobs = parse_jobs(["echo a", "echo b"])
+    assert jobs[0].needs == []
+    assert jobs[1].needs == [jobs[0].name]
+
+
+def test_command_without_cmd_is_rejected():
+    with pytest.raises(ValueError, match="'build'"):
+        parse_jobs([{"name": "build"}])
+
+
+def test_unknown_need_is_rejected():
+    with pytest.raises(ValueError, match="unknown command 'missing'"):
+        parse_jobs([{"name": "a", "cmd": "true", "needs": ["missing"]}])
+
+
+def test_independent_jobs_run_in_parallel(tmp_path):
+    jobs = parse_jobs(
+        [{"name": f"job{i}", "cmd": "sleep 0.5", "needs": []} for i in range(4)]
+    )
+    start = time.perf_counter()
+    results = run_jobs(jobs, cwd=tmp_path, max_workers=4)
+    elapsed = time.perf_counter() - start
+
+    assert [res.status for res in results] == [OK] * 4
+    assert report(results)
+    # Run one after the other they would take at least 2 seconds
+    assert elapsed < 1.5
+
+
+def test_failed_dependency_skips_dependents(tmp_path):
+    jobs = parse_jobs(
+        [
+            {"name": "build", "cmd": "exit 3"},
+            {"name": "pdf", "cmd": "touch pdf", "needs": "build"},
+            {"name": "lint", "cmd": "true", "needs": []},
+        ]
+    )
+    results = {res.job.name: res for res in run_jobs(jobs, cwd=tmp_path, max_workers=2)}
+
+    assert results["build"].status == FAILED
+    assert results["build"].returncode == 3
+    assert results["pdf"].status == SKIPPED
+    assert results["lint"].status == OK
+    assert not (tmp_path / "pdf").exists()
+    assert not report(list(results.values()))
+
+
+def test_timeout_kills_the_command(tmp_path):
+    jobs = parse_jobs(["sleep 10; touch done"], default_timeout=0.5)
+    start = time.perf_counter()
+    results = run_jobs(jobs, cwd=tmp_path)
+
+    assert results[0].status == TIMEOUT
+    assert time.perf_counter() - start < 5
+    assert not (tmp_path / "done").exists()
+
+
+def test_outputs_are_restored_from_the_cache(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cwd = tmp_path / "cooked"
+    cwd.mkdir()
+    cmds = [{"name": "pdf", "cmd": "echo $$ > out.txt", "outputs": ["out.txt"]}]
+
+    first = run_jobs(parse_jobs(cmds), cwd=cwd, inputs_digest="a", cache_dir=cache_dir)
+    content = (cwd / "out.txt").read_text()
+    (cwd / "out.txt").unlink()
+    second = run_jobs(parse_jobs(cmds), cwd=cwd, inputs_digest="a", cache_dir=cache_dir)
+
+    assert [first[0].status, second[0].status] == [OK, CACHED]
+    assert (cwd / "out.txt").read_text() == content
+    # Only the cache entry is left, no temporary folders
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_caching_an_existing_entry_does_not_fail(tmp_path):
+    job = parse_jobs([{"name": "pdf", "cmd": "true", "outputs": ["out.txt"]}])[0]
+    (tmp_path / "out.txt").write_text("pdf")
+    entry = tmp_path / "cache" / "key"
+
+    _store_in_cache(job, entry, tmp_path)
+    _store_in_cache(job, entry, tmp_path)
+
+    assert (entry / "out.txt").read_text() == "pdf"
+    assert len(list(entry.parent.iterdir())) == 1
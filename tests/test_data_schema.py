@@ -0,0 +1,135 @@
+import copy
+import datetime
+
+import pytest
+
+from yuca.data.data_app import update_stats
+from yuca.data_schema import (
+    Record,
+    ValidationError,
+    compile_spec,
+    make_record_type,
+    validate_user_data,
+)
+
+SPEC = {
+    "type": "dict",
+    "record": "Person",
+    "fields": {
+        "name": {"type": "str", "required": True},
+        "age": "int|null",
+        "height": "float",
+        "born": "date",
+        "tags": {"type": "list", "items": "str"},
+        "links": {"type": "dict", "values": "str"},
+        "not a slot": "str",
+    },
+}
+
+
+def _check(spec, value):
+    errors: list[str] = []
+    result = compile_spec(spec)(value, "data", errors)
+    return result, errors
+
+
+def test_valid_data_is_converted_to_records():
+    value = {
+        "name": "Ana",
+        "age": None,
+        "height": 1,
+        "born": datetime.date(1990, 1, 2),
+        "tags": ["a", "b"],
+        "links": {"github": "ana"},
+        "not a slot": "x",
+        "unknown": [1, 2],
+    }
+    record, errors = _check(SPEC, value)
+
+    assert errors == []
+    assert isinstance(record, Record)
+    assert type(record).__name__ == "Person"
+    assert record.name == "Ana"
+    assert dict(record) == value
+
+
+def test_required_fields():
+    _, errors = _check(SPEC, {"age": 3})
+    assert errors == ["data.name: missing required field"]
+
+
+def test_type_errors_are_reported_with_their_path():
+    value = {
+        "name": 3,
+        "age": "3",
+        "height": True,
+        "tags": ["a", 2],
+        "links": {"github": None},
+    }
+    _, errors = _check(SPEC, value)
+
+    assert sorted(errors) == [
+        "data.age: expected int|null, got str",
+        "data.height: expected float, got bool",
+        "data.links.github: expected str, got an empty value",
+        "data.name: expected str, got int",
+        "data.tags[1]: expected str, got int",
+    ]
+
+
+def test_nullable_types():
+    assert _check("int|null", None) == (None, [])
+    assert _check("int", None)[1] == ["data: expected int, got an empty value"]
+    assert _check("float", 2) == (2, [])
+    assert _check("bool", 1)[1] == ["data: expected bool, got int"]
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(ValueError, match="Unknown type 'number'"):
+        compile_spec("number")
+
+
+def test_record_mapping_behaviour():
+    Point = make_record_type("Point", ["x", "y", "class"])
+    point = Point(x=1, label="a")
+
+    assert point["x"] == 1 and point.x == 1
+    assert list(point) == ["x", "label"]
+    assert len(point) == 2
+    assert "y" not in point
+    with pytest.raises(KeyError):
+        point["y"]
+
+    # Fields that can not be attributes are kept as extra fields
+    point["class"] = "b"
+    point["y"] = 2
+    assert dict(point) == {"x": 1, "y": 2, "label": "a", "class": "b"}
+
+    del point["x"]
+    del point["label"]
+    assert dict(point) == {"y": 2, "class": "b"}
+    with pytest.raises(KeyError):
+        del point["x"]
+    assert copy.deepcopy(point) == point
+
+
+def test_validate_user_data():
+    data = {"lang": "en", "publications": [{"title": "x"}]}
+    record = validate_user_data(data)
+    assert record["publications"][0]["title"] == "x"
+
+    with pytest.raises(ValidationError) as error:
+        validate_user_data({"personal": {"name": 1}})
+    assert sorted(error.value.errors) == [
+        "data.lang: missing required field",
+        "data.personal.name: expected str, got int",
+    ]
+
+
+def test_stats_of_validated_data_without_citations():
+    data = {
+        "lang": "en",
+        "publications": [{"title": "x"}, {"title": "y", "citations": 3}],
+    }
+    validate_user_data(data)
+    assert update_stats(data)["stats"]["citations"] == 3
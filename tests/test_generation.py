@@ -0,0 +1,94 @@
+import copy
+import io
+import zipfile
+
+import pytest
+
+from yuca.generation import render_recipe
+
+CONFIG = """\
+scape_format: latex
+template_files:
+  - main.tex
+  - sub/part.tex
+overridable_files:
+  photo: img/photo.png
+default_settings:
+  color: blue
+intl:
+  en:
+    pubs: Publications
+"""
+
+MAIN = """\
+{{ personal.name }} {{ settings.color }}
+{{ intl.pubs }}:{% for p in publications %} {{ p.title }}{% endfor %}
+"""
+
+TEMPLATE_FILES = {
+    "config.yml": CONFIG,
+    "main.tex": MAIN,
+    "sub/part.tex": "{{ personal.email }}",
+    "img/photo.png": "template photo",
+}
+
+USER_DATA = {
+    "lang": "en",
+    "personal": {"name": "Ana & Bob", "email": "ana@example.com"},
+    "publications": [{"title": "First"}, {"title": "Second"}],
+}
+
+EXPECTED = {
+    "main.tex": "Ana \\& Bob red\nPublications: First Second",
+    "sub/part.tex": "ana@example.com",
+}
+
+
+@pytest.fixture
+def template_folder(tmp_path):
+    folder = tmp_path / "template"
+    for rel_path, text in TEMPLATE_FILES.items():
+        (folder / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (folder / rel_path).write_text(text)
+    return folder
+
+
+@pytest.fixture
+def zip_template_folder():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for rel_path, text in TEMPLATE_FILES.items():
+            zip_file.writestr(f"template/{rel_path}", text)
+    return zipfile.Path(zipfile.ZipFile(buffer), "template/")
+
+
+@pytest.mark.parametrize("folder", ["template_folder", "zip_template_folder"])
+def test_render_recipe(folder, request):
+    user_data = copy.deepcopy(USER_DATA)
+    user_config = {"settings": {"color": "red"}}
+
+    template = request.getfixturevalue(folder)
+
+    assert render_recipe(template, user_config, user_data) == EXPECTED
+    # Rendering again gives the same result and the user data is not modified
+    assert render_recipe(template, user_config, user_data) == EXPECTED
+    assert user_data == USER_DATA
+
+
+def test_render_recipe_with_user_files(template_folder, tmp_path):
+    static_folder = tmp_path / "static"
+    static_folder.mkdir()
+    (static_folder / "me.png").write_bytes(b"user photo")
+    user_config = {"files": {"photo": "me.png"}, "static": str(static_folder)}
+
+    outputs = render_recipe(template_folder, user_config, copy.deepcopy(USER_DATA))
+
+    assert outputs["img/photo.png"] == b"user photo"
+
+
+def test_render_recipe_without_static_folder(template_folder):
+    user_config = {"files": {"photo": "me.png"}}
+
+    outputs = render_recipe(template_folder, user_config, copy.deepcopy(USER_DATA))
+
+    assert "img/photo.png" not in outputs
@@ -0,0 +1,107 @@
+import pytest
+
+from yuca.generation import _process_queries
+from yuca.queries import QueryIndex, QueryResult
+
+PUBLICATIONS = [
+    {"title": "b", "year": 2020, "citations": 10, "venue": {"name": "Nature"}},
+    {"title": "a", "year": 2018, "citations": 30},
+    {"title": "c", "year": 2020, "citations": 10},
+    {"title": "d", "citations": 5},
+    {"title": "e", "year": 2015, "citations": 0, "tags": ["ml", "bio"]},
+]
+
+
+def _titles(query: dict, base: list = PUBLICATIONS) -> list[str]:
+    return [item["title"] for item in QueryResult(base, query, QueryIndex())]
+
+
+@pytest.mark.parametrize(
+    "where, expected",
+    [
+        ({"year": 2020}, ["b", "c"]),
+        ({"year": {">=": 2018}}, ["b", "a", "c"]),
+        ({"year": {">": 2015, "<": 2020}}, ["a"]),
+        ({"year": {"!=": 2020}}, ["a", "e"]),
+        ({"year": {"in": [2015, 2018]}}, ["a", "e"]),
+        ({"year": {"not in": [2015, 2018]}}, ["b", "c"]),
+        ({"tags": {"contains": "bio"}}, ["e"]),
+        ({"venue.name": "Nature"}, ["b"]),
+        ({"year": 2020, "citations": {"<=": 10}}, ["b", "c"]),
+        ({"year": {">": "2018"}}, []),
+    ],
+)
+def test_where(where, expected):
+    assert _titles({"where": where}) == expected
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError, match="Unknown query operator '~'"):
+        QueryResult(PUBLICATIONS, {"where": {"year": {"~": 1}}}, QueryIndex())
+
+
+def test_sort_by_several_keys_with_missing_values_last():
+    assert _titles({"sort": "year"}) == ["e", "a", "b", "c", "d"]
+    assert _titles({"sort": ["-year", "-title"]}) == ["c", "b", "a", "e", "d"]
+    assert _titles({"sort": ["-citations", "title"]}) == ["a", "b", "c", "d", "e"]
+
+
+def test_limit_and_offset():
+    query = {"sort": ["-citations", "title"]}
+    assert _titles({**query, "limit": 2}) == ["a", "b"]
+    assert _titles({**query, "offset": 1, "limit": 2}) == ["b", "c"]
+    assert _titles({**query, "offset": 4, "limit": 2}) == ["e"]
+    assert _titles({**query, "limit": 0}) == []
+    assert _titles({"where": {"year": 2020}, "offset": 1}) == ["c"]
+
+
+def test_group_by():
+    result = QueryResult(
+        PUBLICATIONS, {"sort": "-year", "group_by": "year"}, QueryIndex()
+    )
+    groups = [(g.grouper, [p["title"] for p in g.list]) for g in result]
+    assert groups == [(2020, ["b", "c"]), (2018, ["a"]), (2015, ["e"]), (None, ["d"])]
+
+
+def test_queries_replace_the_list_or_add_a_new_one():
+    context = {"publications": list(PUBLICATIONS)}
+    _process_queries(
+        context, {"publications": {"sort": "title", "limit": 2, "as": "first"}}
+    )
+    _process_queries(context, {"publications": {"where": {"year": 2020}}})
+
+    assert [p["title"] for p in context["first"]] == ["a", "b"]
+    assert [p["title"] for p in context["publications"]] == ["b", "c"]
+
+
+def test_query_without_options_keeps_the_whole_list():
+    context = {"publications": list(PUBLICATIONS)}
+    _process_queries(context, {"publications": None})
+    assert list(context["publications"]) == PUBLICATIONS
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "abc",
+        {"where": ["x"]},
+        {"where": "abc"},
+        {"sort": 3},
+        {"limit": [1]},
+        {"where": {"year": {"~": 1}}},
+    ],
+)
+def test_invalid_queries_are_reported(query, caplog):
+    context = {"publications": list(PUBLICATIONS)}
+    _process_queries(context, {"publications": query})
+
+    assert context["publications"] == PUBLICATIONS
+    assert "Invalid query 'publications'" in caplog.text
+
+
+def test_queries_over_other_values_are_reported(caplog):
+    context = {"personal": {"name": "Ana"}}
+    _process_queries(context, {"personal.name": {}, "missing.list": {}})
+
+    assert "Can not query 'personal.name'" in caplog.text
+    assert "Can not query 'missing.list'" in caplog.text
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import stat
+
+from yuca.store import MANIFEST_FILE, ArtifactStore, _hash_data, detach_from_store
+
+
+def _digest(data) -> str:
+    hasher = hashlib.sha256()
+    _hash_data(hasher, data)
+    return hasher.hexdigest()
+
+
+def test_data_with_mixed_key_types_is_hashed():
+    data = {"socials": {2018: "old", "github": "new"}}
+    assert _digest(data) == _digest({"socials": {"github": "new", 2018: "old"}})
+    assert _digest(data) != _digest({"socials": {2019: "old", "github": "new"}})
+
+
+def _cooked_folder(folder, files):
+    for rel_path, text in files.items():
+        (folder / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (folder / rel_path).write_text(text)
+    return folder
+
+
+def test_only_the_given_files_are_stored_as_read_only(tmp_path):
+    store = ArtifactStore(tmp_path / "store")
+    cooked = _cooked_folder(
+        tmp_path / "cooked", {"main.tex": "tex", "sub/part.tex": "part", "old": "x"}
+    )
+
+    store.put("abcd", cooked, ["main.tex", "sub/part.tex", "missing.pdf"])
+
+    entry = store.get("abcd")
+    assert entry is not None
+    stored = sorted(f.relative_to(entry).as_posix() for f in entry.rglob("*.*"))
+    assert stored == ["main.tex", "sub/part.tex"]
+    assert not (entry / "main.tex").stat().st_mode & stat.S_IWUSR
+
+
+def test_materialize_replaces_the_files_of_previous_cooks(tmp_path):
+    store = ArtifactStore(tmp_path / "store")
+    cooked = _cooked_folder(tmp_path / "cooked", {"main.tex": "Name", "out.pdf": "N"})
+    store.put("abcd", cooked)
+    output = _cooked_folder(
+        tmp_path / "output", {"main.tex": "Bob", "out.pdf": "B", "extra.txt": "B"}
+    )
+
+    assert store.materialize("abcd", output)
+
+    assert (output / "main.tex").read_text() == "Name"
+    assert (output / "out.pdf").read_text() == "N"
+    assert not (output / "extra.txt").exists()
+    assert (output / MANIFEST_FILE).exists()
+
+    detach_from_store(output)
+    assert os.listdir(output) == []
+    assert (store.get("abcd") / "main.tex").read_text() == "Name"
+
+
+def test_prune_removes_unused_entries(tmp_path):
+    store = ArtifactStore(tmp_path / "store")
+    cooked = _cooked_folder(tmp_path / "cooked", {"main.tex": "tex"})
+    store.put("aaaa", cooked)
+    store.put("bbbb", cooked)
+    old = store.get("aaaa")
+    os.utime(old, (0, 0))
+
+    assert store.prune(max_age=60) == 1
+    assert not store.has("aaaa") and store.has("bbbb")
+    assert store.prune() == 1
+    assert list(store.root.iterdir()) == []
@@ -1,53 +1,127 @@
 from __future__ import annotations
 
+import functools
+import os
+from contextlib import contextmanager
 from pathlib import Path
 
 import platformdirs
 
 from yuca.data_handlers import load_yaml, save_yaml
 
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
 APP_NAME = "yuca"
 
 
 def update_data_after_run(func):
+    # Runs the function as a transaction over the app data: the data is reloaded
+    # under the file lock and saved afterwards (only if it changed)
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        func(*args, **kwargs)
-        AppData.instance()._update()
+        with AppData.instance()._transaction():
+            return func(*args, **kwargs)
 
     return wrapper
 
 
+class _FileLock:
+    # Exclusive lock between processes, held on a separate lock file since the
+    # data file itself is replaced on every write
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __enter__(self):
+        self._fd = open(self.path, "a+")
+        if os.name == "nt":
+            self._fd.seek(0)
+            msvcrt.locking(self._fd.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                self._fd.seek(0)
+                msvcrt.locking(self._fd.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._fd.close()
+
+
 class AppData:
     _instance: AppData | None = None
 
     def __init__(self):
         self.app_data_dir = Path(platformdirs.user_data_dir(APP_NAME)) / "data.yml"
         self.app_data_dir.parent.mkdir(parents=True, exist_ok=True)
-        self.data = (
-            load_yaml(str(self.app_data_dir)) if self.app_data_dir.exists() else {}
-        )
+        self._lock_path = self.app_data_dir.with_name("data.yml.lock")
+        self._stamp: tuple[int, int] | None = None
+        self._load()
+        self._check_warehouses_path()
 
-        self.warehouses = self.data.get("warehouses", []) or []
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = self.app_data_dir.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        # The stamp is taken before reading, so a concurrent write is detected
+        # (and reloaded) on the next refresh
+        self._stamp = self._file_stamp()
+        data = load_yaml(str(self.app_data_dir)) if self._stamp is not None else {}
+        self.data = data or {}
+        self.warehouses = list(self.data.get("warehouses", []) or [])
         self.active_wh = self.data.get("active_wh", 0)
 
-        self._check_warehouses_path()
+    def _refresh(self):
+        # Read only fast path: the data is only reloaded if the file changed
+        if self._file_stamp() != self._stamp:
+            self._load()
 
-    def _check_warehouses_path(self):
+    def _prune_warehouses(self):
         if not self.warehouses:
             return
-        active_wh_path = self.warehouses[self.active_wh]
+        active_wh_path = (
+            self.warehouses[self.active_wh]
+            if 0 <= self.active_wh < len(self.warehouses)
+            else None
+        )
         self.warehouses = [wh for wh in self.warehouses if Path(wh).exists()]
         self.active_wh = (
             self.warehouses.index(active_wh_path)
             if active_wh_path in self.warehouses
             else 0
         )
-        self._update()
+
+    def _check_warehouses_path(self):
+        if all(Path(wh).exists() for wh in self.warehouses):
+            return
+        with self._transaction():
+            self._prune_warehouses()
+
+    @contextmanager
+    def _transaction(self):
+        with _FileLock(self._lock_path):
+            self._load()
+            before = (list(self.warehouses), self.active_wh)
+            yield
+            if (self.warehouses, self.active_wh) != before:
+                self._update()
 
     def _update(self):
         self.data["warehouses"] = self.warehouses
         self.data["active_wh"] = self.active_wh
         save_yaml(self.data, self.app_data_dir)
+        self._stamp = self._file_stamp()
 
     @classmethod
     def instance(cls) -> AppData:
@@ -58,11 +132,13 @@ class AppData:
     @staticmethod
     def get_warehouses() -> list[str]:
         inst = AppData.instance()
+        inst._refresh()
         return inst.warehouses
 
     @staticmethod
     def has_warehouses() -> bool:
         inst = AppData.instance()
+        inst._refresh()
         return len(inst.warehouses) > 0
 
     @staticmethod
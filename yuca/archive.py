@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import io
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Literal
+
+# Files that are already compressed are stored as they are in zip archives
+COMPRESSED_SUFFIXES = {
+    ".7z", ".avif", ".bz2", ".docx", ".epub", ".gif", ".gz", ".jpeg", ".jpg",
+    ".mp3", ".mp4", ".odt", ".pdf", ".png", ".pptx", ".webm", ".webp", ".woff",
+    ".woff2", ".xlsx", ".xz", ".zip", ".zst",
+}  # fmt: skip
+
+TarMode = Literal["w", "w:gz", "w:bz2", "w:xz"]
+
+TAR_MODES: dict[str, TarMode] = {
+    ".tar": "w",
+    ".tar.gz": "w:gz",
+    ".tgz": "w:gz",
+    ".tar.bz2": "w:bz2",
+    ".tar.xz": "w:xz",
+}
+ARCHIVE_SUFFIXES = [".zip", ".tar.zst", *TAR_MODES]
+
+
+def archive_suffix(path: Path) -> str | None:
+    name = path.name.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+class _ZipWriter:
+    def __init__(self, path: Path):
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    @staticmethod
+    def _compress_type(arcname: str) -> int:
+        if Path(arcname).suffix.lower() in COMPRESSED_SUFFIXES:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def add_file(self, arcname: str, src: Path):
+        info = zipfile.ZipInfo.from_file(src, arcname)
+        info.compress_type = self._compress_type(arcname)
+        with open(src, "rb") as src_fd, self._zip.open(info, "w") as dst_fd:
+            shutil.copyfileobj(src_fd, dst_fd)
+
+    def add_bytes(self, arcname: str, data: bytes):
+        info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+        info.compress_type = self._compress_type(arcname)
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+
+    def close(self):
+        self._zip.close()
+
+
+class _TarWriter:
+    def __init__(self, path: Path, suffix: str):
+        self._fd = None
+        if suffix == ".tar.zst":
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError(
+                    "Writing '.tar.zst' archives requires the 'zstandard' package "
+                    "(pip install yuca[zstd])"
+                ) from None
+            # zstd compresses the tar stream using all the available cores
+            compressor = zstandard.ZstdCompressor(threads=-1)
+            self._fd = compressor.stream_writer(open(path, "wb"))
+            self._tar = tarfile.open(fileobj=self._fd, mode="w|")
+        else:
+            self._tar = tarfile.open(path, TAR_MODES[suffix])
+
+    def add_file(self, arcname: str, src: Path):
+        self._tar.add(src, arcname=arcname, recursive=False)
+
+    def add_bytes(self, arcname: str, data: bytes):
+        info = tarfile.TarInfo(arcname)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self._tar.close()
+        if self._fd is not None:
+            self._fd.close()
+
+
+def write_archive(
+    archive_path: Path,
+    files: Iterable[tuple[Path, Path]] = (),
+    outputs: dict[str, str | bytes] | None = None,
+):
+    # Streams the given (relative path, source path) files and the in memory
+    # outputs into the archive, one entry at a time, so no cooked folder is
+    # needed. The archive format is deduced from the file name.
+    suffix = archive_suffix(archive_path)
+    if suffix is None:
+        raise ValueError(
+            f"Unknown archive format '{archive_path.name}', valid formats: "
+            + ", ".join(ARCHIVE_SUFFIXES)
+        )
+
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    writer: _ZipWriter | _TarWriter
+    if suffix == ".zip":
+        writer = _ZipWriter(archive_path)
+    else:
+        writer = _TarWriter(archive_path, suffix)
+    try:
+        try:
+            for rel_path, src in files:
+                writer.add_file(rel_path.as_posix(), src)
+            for output_path, output in (outputs or {}).items():
+                data = output if isinstance(output, bytes) else output.encode()
+                writer.add_bytes(Path(output_path).as_posix(), data)
+        finally:
+            writer.close()
+    except BaseException:
+        # Incomplete archives are never left behind
+        archive_path.unlink(missing_ok=True)
+        raise
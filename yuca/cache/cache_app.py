@@ -0,0 +1,38 @@
+import logging
+from typing import Annotated, Optional
+
+import typer
+
+from yuca.commands import default_cache_dir
+from yuca.store import open_store, prune_entries
+
+cache_app = typer.Typer()
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+@cache_app.command(
+    "clear", help="Removes the cooks in the artifact store and the post cook cache"
+)
+def cache_clear(
+    older_than: Annotated[
+        Optional[float],
+        typer.Option(
+            help="Only remove the entries not used in the given number of days"
+        ),
+    ] = None,
+    store_location: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="YUCA_STORE",
+            help="Artifact store location. Only the local copy of the entries of "
+            "http(s) stores is removed. Defaults to the yuca cache folder",
+        ),
+    ] = None,
+):
+    max_age = None if older_than is None else older_than * SECONDS_PER_DAY
+    store = open_store(store_location)
+    removed = store.prune(max_age)
+    logging.info(f"Removed {removed} entries from the artifact store ({store.root})")
+    removed = prune_entries(default_cache_dir(), max_age)
+    logging.info(f"Removed {removed} entries from the post cook cache")
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import platformdirs
+
+from yuca.app_data import APP_NAME
+
+OK, FAILED, TIMEOUT, SKIPPED, CACHED = "ok", "failed", "timeout", "skipped", "cached"
+SUCCESSFUL_STATUS = (OK, CACHED)
+
+
+@dataclass
+class Job:
+    name: str
+    cmd: str
+    needs: list[str] = field(default_factory=list)
+    timeout: float | None = None
+    outputs: list[str] = field(default_factory=list)
+
+
+@dataclass
+class JobResult:
+    job: Job
+    status: str
+    returncode: int | None = None
+    duration: float = 0.0
+    output: str = ""
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status in SUCCESSFUL_STATUS
+
+
+def default_cache_dir() -> Path:
+    return Path(platformdirs.user_cache_dir(APP_NAME)) / "post_cook"
+
+
+def parse_jobs(cmds: str | list, default_timeout: float | None = None) -> list[Job]:
+    # Commands can be given as plain strings or as dicts like:
+    #   {name: pdf, cmd: latexmk main.tex, needs: [...], timeout: 60,
+    #    outputs: [main.pdf]}
+    # A command that does not declare 'needs' depends on the previous one, so
+    # plain lists of commands keep running one after the other.
+    if isinstance(cmds, str):
+        cmds = [cmds]
+
+    jobs: list[Job] = []
+    for i, cmd in enumerate(cmds):
+        if isinstance(cmd, str):
+            cmd = {"cmd": cmd}
+        if not isinstance(cmd, dict):
+            raise ValueError(f"Command {i} must be a string or a dict, got {cmd!r}")
+        name = str(cmd.get("name", f"cmd{i}"))
+        if not cmd.get("cmd"):
+            raise ValueError(f"Command '{name}' has no 'cmd' to run")
+        needs = cmd.get("needs")
+        if needs is None:
+            needs = [jobs[-1].name] if jobs else []
+        elif isinstance(needs, str):
+            needs = [needs]
+        jobs.append(
+            Job(
+                name=name,
+                cmd=str(cmd["cmd"]),
+                needs=[str(n) for n in needs],
+                timeout=cmd.get("timeout", default_timeout),
+                outputs=[str(o) for o in cmd.get("outputs", []) or []],
+            )
+        )
+
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicated command names in {names}")
+    for job in jobs:
+        for need in job.needs:
+            if need not in names:
+                raise ValueError(f"Command '{job.name}' needs unknown command '{need}'")
+    return jobs
+
+
+def _job_keys(jobs: list[Job], inputs_digest: str) -> dict[str, str]:
+    # Key of every job: the inputs digest plus the job definition and the keys
+    # of the jobs it depends on. Jobs are visited in declaration order, so
+    # dependencies declared afterwards are resolved lazily.
+    by_name = {job.name: job for job in jobs}
+    keys: dict[str, str] = {}
+
+    def key_of(job: Job, visiting: tuple[str, ...] = ()) -> str:
+        if job.name in keys:
+            return keys[job.name]
+        if job.name in visiting:
+            raise ValueError(f"Circular dependency on command '{job.name}'")
+        hasher = hashlib.sha256(inputs_digest.encode())
+        hasher.update(job.cmd.encode())
+        for out in job.outputs:
+            hasher.update(b"\0" + out.encode())
+        for need in job.needs:
+            need_key = key_of(by_name[need], visiting + (job.name,))
+            hasher.update(b"\0" + need_key.encode())
+        keys[job.name] = hasher.hexdigest()
+        return keys[job.name]
+
+    for job in jobs:
+        key_of(job)
+    return keys
+
+
+def _restore_from_cache(job: Job, entry: Path, cwd: Path) -> bool:
+    if not job.outputs or not all((entry / o).is_file() for o in job.outputs):
+        return False
+    for out in job.outputs:
+        dst = cwd / out
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry / out, dst)
+    # The entry is marked as used, so it is kept when pruning old entries
+    os.utime(entry)
+    return True
+
+
+def _store_in_cache(job: Job, entry: Path, cwd: Path):
+    if not job.outputs or entry.is_dir():
+        return
+    missing = [o for o in job.outputs if not (cwd / o).is_file()]
+    if missing:
+        logging.warning(f"Command '{job.name}' did not produce {missing}")
+        return
+    # Outputs are copied into a temporary entry (unique to this process) that is
+    # renamed at the end, so concurrent cooks never see incomplete entries
+    tmp_entry = entry.with_name(f"{entry.name}.{uuid.uuid4().hex}.tmp")
+    for out in job.outputs:
+        dst = tmp_entry / out
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cwd / out, dst)
+    try:
+        tmp_entry.rename(entry)
+    except OSError:
+        # Another process cached the same outputs first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+
+def _kill(proc: subprocess.Popen):
+    # Shell commands spawn children that would keep the output pipe open, so the
+    # whole process group is killed when possible
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        # The command finished right at the timeout
+        pass
+
+
+def _run_job(job: Job, cwd: Path | None) -> JobResult:
+    print(f"> {job.cmd}")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        job.cmd,
+        shell=True,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        output, _ = proc.communicate(timeout=job.timeout)
+    except subprocess.TimeoutExpired:
+        _kill(proc)
+        output, _ = proc.communicate()
+        return JobResult(job, TIMEOUT, None, time.perf_counter() - start, output)
+    status = OK if proc.returncode == 0 else FAILED
+    return JobResult(job, status, proc.returncode, time.perf_counter() - start, output)
+
+
+def run_jobs(
+    jobs: list[Job],
+    cwd: Path | None = None,
+    max_workers: int = 1,
+    inputs_digest: str | None = None,
+    cache_dir: Path | None = None,
+) -> list[JobResult]:
+    # Runs the job graph with at most 'max_workers' commands at the same time.
+    # When an inputs digest is given, jobs declaring 'outputs' are cached: if
+    # the same job already ran over the same inputs its outputs are restored
+    # instead of running the command again.
+    keys = _job_keys(jobs, inputs_digest) if inputs_digest is not None else {}
+    cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+    work_dir = Path.cwd() if cwd is None else cwd
+
+    results: dict[str, JobResult] = {}
+    pending = list(jobs)
+    running: dict[Future, Job] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            resolved = len(results)
+            for job in list(pending):
+                if any(n not in results for n in job.needs):
+                    continue
+                pending.remove(job)
+
+                if not all(results[n].succeeded for n in job.needs):
+                    results[job.name] = JobResult(job, SKIPPED)
+                    continue
+
+                key = keys.get(job.name)
+                if key is not None and _restore_from_cache(
+                    job, cache_dir / key, work_dir
+                ):
+                    print(f"> {job.cmd} (cached)")
+                    results[job.name] = JobResult(job, CACHED)
+                    continue
+
+                running[executor.submit(_run_job, job, cwd)] = job
+
+            if not running:
+                if len(results) == resolved:
+                    names = [job.name for job in pending]
+                    raise ValueError(f"Circular dependency between commands {names}")
+                # Newly resolved jobs (skipped or cached) may unlock others
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                result = future.result()
+                results[job.name] = result
+                if result.output:
+                    print(result.output, end="")
+                key = keys.get(job.name)
+                if result.status == OK and key is not None:
+                    _store_in_cache(job, cache_dir / key, work_dir)
+
+    return [results[job.name] for job in jobs]
+
+
+def report(results: list[JobResult]) -> bool:
+    for res in results:
+        msg = f"[{res.status}] {res.job.name} ({res.duration:.2f}s): {res.job.cmd}"
+        if res.returncode is not None:
+            msg += f" -> exit code {res.returncode}"
+        if res.succeeded:
+            logging.info(msg)
+        else:
+            logging.error(msg)
+    return all(res.succeeded for res in results)
@@ -1,6 +1,7 @@
 import functools
 import logging
 from pathlib import Path
+from typing import Annotated, Optional
 
 import requests
 import typer
@@ -8,6 +9,7 @@ from bs4 import BeautifulSoup
 
 from yuca.app_data import AppData
 from yuca.data_handlers import load_user_data, save_yaml
+from yuca.data_schema import Record, ValidationError, validate_user_data
 
 data_app = typer.Typer()
 
@@ -90,8 +92,8 @@ def update_publications(data: dict) -> dict:
 
     logging.info(f"Found {len(scraped)} publications/preprints from google scholar")
 
-    publ_dict = {e["title"]: e for e in data["publications"]}
-    prep_dict = {e["title"]: e for e in data["preprints"]}
+    publ_dict = {e["title"]: e for e in data.get("publications", []) or []}
+    prep_dict = {e["title"]: e for e in data.get("preprints", []) or []}
 
     added, updated = 0, 0
 
@@ -117,23 +119,63 @@ def update_publications(data: dict) -> dict:
 
 
 def update_stats(data: dict) -> dict:
-    publications_data = data["publications"]
-    students_data = data["students"]
-    courses_taught_data = data["courses_taught"]
+    publications_data = data.get("publications", []) or []
+    students_data = data.get("students", []) or []
+    courses_taught_data = data.get("courses_taught", []) or []
 
+    if data.get("stats") is None:
+        data["stats"] = {}
     data["stats"]["publications"] = len(publications_data)
-    data["stats"]["citations"] = sum(p["citations"] for p in publications_data)
+    data["stats"]["citations"] = sum(p.get("citations") or 0 for p in publications_data)
     data["stats"]["students"] = len(students_data)
     data["stats"]["courses_taught"] = sum(len(c["dates"]) for c in courses_taught_data)
 
     return data
 
 
+def check_user_data(data: dict, name: str) -> Record | None:
+    try:
+        return validate_user_data(data)
+    except ValidationError as e:
+        logging.error(f"Invalid data file '{name}':")
+        for error in e.errors:
+            logging.error(f"  {error}")
+        return None
+
+
+@data_app.command("validate", help="Validates the data files of the warehouse")
+def data_validate(
+    files: Annotated[
+        Optional[list[str]],
+        typer.Argument(
+            help="Data files to validate. If not specified, all the data files "
+            "of the active warehouse are validated"
+        ),
+    ] = None,
+):
+    if files is None:
+        data_folder = Path(AppData.active_warehouse()) / "data"
+        files = [str(file) for file in sorted(data_folder.glob("*.yml"))]
+
+    valid = True
+    for file in files:
+        if check_user_data(load_user_data(file), file) is not None:
+            logging.info(f"Data file '{file}' is valid")
+        else:
+            valid = False
+
+    if not valid:
+        raise typer.Exit(code=1)
+
+
 @data_app.command("update")
 def data_update():
     data_folder = Path(AppData.active_warehouse()) / "data"
     for file in data_folder.glob("*.yml"):
         data = load_user_data(str(file))
+        if check_user_data(data, str(file)) is None:
+            logging.error(f"Skipping update of '{file.stem}' data")
+            continue
         logging.info(f"Updating '{file.stem}' data")
         data = update_publications(data)
         data = update_stats(data)
@@ -1,3 +1,7 @@
+import os
+import tempfile
+from pathlib import Path
+
 import ruamel.yaml
 
 yaml = ruamel.yaml.YAML()
@@ -10,13 +14,30 @@ def load_yaml(path: str):
         return yaml.load(yaml_fd)
 
 
-def save_yaml(data: dict, path: str):
-    with open(path, "w+") as yaml_fd:
-        return yaml.dump(data, yaml_fd)
-
-
-def load_template_config(path: str):
-    return load_yaml(path)
+def save_yaml(data: dict, path: str | Path):
+    # The data is written to a temporary file that replaces the destination, so
+    # readers never see a partially written file
+    path = Path(path)
+    mode = path.stat().st_mode & 0o777 if path.exists() else 0o644
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as yaml_fd:
+            yaml.dump(data, yaml_fd)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_template_config(path: str | Path):
+    # Template folders can live in virtual filesystems, read them as text
+    if isinstance(path, str):
+        return load_yaml(path)
+    return yaml.load(path.read_text())
 
 
 def load_recipe(path: str):
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import keyword
+from collections.abc import Mapping, MutableMapping
+from pathlib import Path
+from typing import Any, Callable
+
+from yuca.data_handlers import load_yaml
+
+USER_DATA_SCHEMA_PATH = Path(__file__).parent / "warehouse" / "user_data_schema.yml"
+
+SCALAR_TYPES: dict[str, tuple[type, ...]] = {
+    "str": (str,),
+    "int": (int,),
+    "float": (float, int),
+    "bool": (bool,),
+    "date": (datetime.date,),
+}
+
+_MISSING = object()
+
+# A checker validates a value, appending the errors found, and returns the value
+# converted to its typed version (records instead of dicts). Paths are given as
+# (parent path, key) pairs and only formatted when an error is found.
+Checker = Callable[[Any, Any, list], Any]
+
+
+class ValidationError(Exception):
+    def __init__(self, errors: list[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+class Record(MutableMapping):
+    # Base of the typed records built from the dicts declared with 'fields' in a
+    # schema. Declared fields are stored in slots and any other field in
+    # '_extra', so records can be used as the dicts they replace.
+    __slots__ = ("_extra",)
+    _fields: tuple[str, ...] = ()
+    _field_set: frozenset[str] = frozenset()
+
+    def __init__(self, **kwargs):
+        self._extra = {}
+        for key, val in kwargs.items():
+            self[key] = val
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for field in self._fields:
+            if hasattr(self, field):
+                yield field
+        yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+def _slot_name(field: str) -> bool:
+    # Fields that can not be attributes (or would hide the Mapping methods) are
+    # kept in '_extra'
+    return (
+        field.isidentifier()
+        and not keyword.iskeyword(field)
+        and not hasattr(Record, field)
+    )
+
+
+def make_record_type(name: str, fields: list[str]) -> type[Record]:
+    slots = tuple(f for f in fields if _slot_name(f))
+    return type(
+        name,
+        (Record,),
+        {
+            "__slots__": slots,
+            "__module__": __name__,
+            "_fields": slots,
+            "_field_set": frozenset(slots),
+        },
+    )
+
+
+def format_path(path) -> str:
+    keys = []
+    while isinstance(path, tuple):
+        path, key = path
+        keys.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return str(path) + "".join(reversed(keys))
+
+
+def _type_error(path, expected: str, value: Any) -> str:
+    return f"{format_path(path)}: expected {expected}, got {type(value).__name__}"
+
+
+def _compile_types(type_spec: str) -> tuple[tuple[type, ...], bool]:
+    types: tuple[type, ...] = ()
+    nullable = False
+    for type_name in type_spec.split("|"):
+        type_name = type_name.strip()
+        if type_name == "null":
+            nullable = True
+        elif type_name in SCALAR_TYPES:
+            types += SCALAR_TYPES[type_name]
+        else:
+            raise ValueError(f"Unknown type '{type_name}' in schema")
+    return types, nullable
+
+
+def _compile_scalar(type_spec: str) -> Checker:
+    types, nullable = _compile_types(type_spec)
+    accepts_bool = bool in types
+    # Fast path for the most common case: values of exactly the expected types
+    exact_types = frozenset(types)
+
+    def check(value, path, errors):
+        if value.__class__ in exact_types:
+            return value
+        if value is None:
+            if not nullable:
+                errors.append(
+                    f"{format_path(path)}: expected {type_spec}, got an empty value"
+                )
+        elif not isinstance(value, types) or (
+            isinstance(value, bool) and not accepts_bool
+        ):
+            errors.append(_type_error(path, type_spec, value))
+        return value
+
+    check.exact_types = exact_types  # type: ignore[attr-defined]
+    return check
+
+
+def _compile_list(spec: Mapping) -> Checker:
+    items = spec.get("items")
+    check_item = None if items is None else compile_spec(items)
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            errors.append(_type_error(path, "list", value))
+            return value
+        if check_item is None:
+            return value
+        return [check_item(v, (path, i), errors) for i, v in enumerate(value)]
+
+    return check
+
+
+def _compile_dict(spec: Mapping) -> Checker:
+    fields = spec.get("fields")
+    values = spec.get("values")
+
+    if fields is not None:
+        field_checkers = {str(k): compile_spec(v) for k, v in fields.items()}
+        required = frozenset(
+            str(k)
+            for k, v in fields.items()
+            if isinstance(v, Mapping) and v.get("required")
+        )
+        record_type = make_record_type(
+            str(spec.get("record", "Record")), list(field_checkers)
+        )
+        # Scalar values of the exact expected types are accepted inline, without
+        # calling their checker
+        slot_checkers: list[tuple[str, frozenset, Checker]] = [
+            (k, getattr(c, "exact_types", frozenset()), c)
+            for k, c in field_checkers.items()
+            if k in record_type._field_set
+        ]
+        new_record = Record.__new__
+
+        def check_fields(value, path, errors):
+            if not isinstance(value, dict) and not isinstance(value, Mapping):
+                errors.append(_type_error(path, "dict", value))
+                return value
+
+            # Declared fields are looked up directly, the rest of the keys (if
+            # any) are kept as extra fields
+            record = new_record(record_type)
+            get = value.get
+            found = 0
+            for key, exact_types, checker in slot_checkers:
+                val = get(key, _MISSING)
+                if val is _MISSING:
+                    if key in required:
+                        errors.append(
+                            f"{format_path((path, key))}: missing required field"
+                        )
+                    continue
+                if val.__class__ not in exact_types:
+                    val = checker(val, (path, key), errors)
+                setattr(record, key, val)
+                found += 1
+
+            extra = {}
+            if found < len(value):
+                for key, val in value.items():
+                    if key in record_type._field_set:
+                        continue
+                    checker = field_checkers.get(key)
+                    if checker is not None:
+                        val = checker(val, (path, key), errors)
+                    extra[key] = val
+            for key in required:
+                if key not in record_type._field_set and key not in extra:
+                    errors.append(f"{format_path((path, key))}: missing required field")
+            record._extra = extra
+            return record
+
+        return check_fields
+
+    check_value = None if values is None else compile_spec(values)
+
+    def check_values(value, path, errors):
+        if not isinstance(value, Mapping):
+            errors.append(_type_error(path, "dict", value))
+            return value
+        if check_value is None:
+            return value
+        return {k: check_value(v, (path, k), errors) for k, v in value.items()}
+
+    return check_values
+
+
+def _check_any(value, path, errors):
+    return value
+
+
+def compile_spec(spec: str | Mapping) -> Checker:
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    type_spec = str(spec.get("type", "any"))
+    if type_spec == "any":
+        return _check_any
+    if type_spec == "list":
+        return _compile_list(spec)
+    if type_spec == "dict":
+        return _compile_dict(spec)
+    return _compile_scalar(type_spec)
+
+
+@functools.lru_cache
+def _user_data_checker(schema_path: str) -> Checker:
+    return compile_spec(load_yaml(schema_path))
+
+
+def validate_user_data(data: Any, schema_path: Path = USER_DATA_SCHEMA_PATH):
+    # Returns the typed version of the user data, raises ValidationError with
+    # every problem found otherwise
+    errors: list[str] = []
+    record = _user_data_checker(str(schema_path))(data, "data", errors)
+    if errors:
+        raise ValidationError(errors)
+    return record
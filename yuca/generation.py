@@ -1,12 +1,18 @@
+import copy
+import functools
+import hashlib
 import logging
+import os
 import re
 import shutil
+from collections.abc import Mapping, MutableMapping, Sequence
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Container, Iterable, Iterator
 
 import jinja2
 
 from yuca.data_handlers import load_template_config
+from yuca.queries import QueryIndex, QueryResult
 
 VALID_ESCAPE_FORMATS = ["latex"]
 SETTINGS_VAR_REGEX = re.compile(r"([^\[\]]+)(\[(\d+)\]|)$")
@@ -18,17 +24,21 @@ DEFAUL_JINJA_CONFIG = dict(
 )
 
 
-def fill_template_file(
-    file: Path,
-    content: dict = {},
+def render_template_text(
+    text: str,
+    file_name: str,
+    content: Mapping = {},
     config: dict = {},
-):
-    jinja_config: dict[str, Any] = DEFAUL_JINJA_CONFIG
+) -> str:
+    jinja_config: dict[str, Any] = dict(DEFAUL_JINJA_CONFIG)
     for key, val in config.get("jinja_config", {}).items():
-        if re.match(key, str(file.absolute().resolve())):
+        if re.match(key, file_name):
             jinja_config.update(val)
-    environment = jinja2.Environment(**jinja_config)
-    template = environment.from_string(file.read_text())
+    try:
+        template = _compile_template(text, tuple(sorted(jinja_config.items())))
+    except TypeError:
+        # Unhashable jinja options can not be cached
+        template = jinja2.Environment(**jinja_config).from_string(text)
 
     def defined_and_not_empty(var):
         return len(content.get(var, [])) > 0
@@ -36,12 +46,47 @@ def fill_template_file(
     def defined_and_not_empty_any(*var):
         return any(defined_and_not_empty(v) for v in var)
 
-    template.globals[defined_and_not_empty.__name__] = defined_and_not_empty
-    template.globals[defined_and_not_empty_any.__name__] = defined_and_not_empty_any
-    rendered_content = template.render(content)
+    # Helpers are given with the render context (not as template globals) so
+    # the same compiled template can be rendered concurrently
+    return template.render(
+        content,
+        **{
+            defined_and_not_empty.__name__: defined_and_not_empty,
+            defined_and_not_empty_any.__name__: defined_and_not_empty_any,
+        },
+    )
+
+
+# Compiled templates are cached by their text, the cache is bounded so long
+# running processes rendering many templates do not grow without limit
+@functools.lru_cache(maxsize=128)
+def _compile_template(text: str, jinja_config: tuple) -> jinja2.Template:
+    environment = jinja2.Environment(**dict(jinja_config))
+    return environment.from_string(text)
+
+
+def fill_template_file(
+    file: Path,
+    content: dict = {},
+    config: dict = {},
+):
+    rendered_content = render_template_text(
+        file.read_text(), _path_name(file, file.name), content, config
+    )
     file.write_text(rendered_content)
 
 
+def _path_name(path: Path, rel_path: str) -> str:
+    # Virtual filesystems (e.g. zipfile.Path) can not be resolved on disk, and
+    # some of them (e.g. in memory zip files) can not even be shown as a path
+    if isinstance(path, Path):
+        return str(path.absolute().resolve())
+    try:
+        return str(path)
+    except TypeError:
+        return rel_path
+
+
 def escape_latex_special_chars(input_string):
     # Define a dictionary to map LaTeX special characters to their escaped counterparts
     latex_special_chars = {
@@ -73,8 +118,8 @@ def escape_latex_special_chars(input_string):
     return escaped_string
 
 
-def escape_strings(data: dict | list, escape_format: str):
-    if isinstance(data, dict):
+def escape_strings(data: MutableMapping | list, escape_format: str):
+    if isinstance(data, MutableMapping):
         for key, value in data.items():
             data[key] = escape_strings(value, escape_format)
     elif isinstance(data, list):
@@ -133,8 +178,8 @@ def _get_data_from_route(context: dict, route: list) -> tuple[dict, str]:
             assert isinstance(data, list)
             data = data[next_route_item]
 
-        # Data must be a dict at the end of every iteration
-        assert isinstance(data, dict)
+        # Data must be a dict (or a record) at the end of every iteration
+        assert isinstance(data, MutableMapping)
 
     return data, route[-1]
 
@@ -151,24 +196,66 @@ def _process_overrides(context, overrides):
         data[key] = val
 
 
-def process_files(
+def collect_user_files(
     user_folder: Path,
     overridable_files: dict,
-    output_folder: Path,
     user_files: dict,
-):
+) -> dict[str, bytes]:
+    collected = {}
     for key, user_file in user_files.items():
         template_file = overridable_files.get(key, None)
         if template_file is None:
             continue
         src_path = user_folder / user_file
-        dst_path = output_folder / template_file
 
         if not src_path.exists():
             logging.error(f"Failed to fetch required file '{src_path}'")
             continue
 
-        shutil.copyfile(str(src_path), str(dst_path))
+        collected[str(template_file)] = src_path.read_bytes()
+    return collected
+
+
+def _parse_route(route_str: str) -> route:
+    # e.g. 'projects[0].highlights' -> ['projects', 0, 'highlights']
+    parsed: route = []
+    for key in route_str.split("."):
+        match = SETTINGS_VAR_REGEX.match(key)
+        assert match is not None
+        key_name, _, index = match.groups()
+        parsed.append(key_name)
+        if index is not None:
+            parsed.append(int(index))
+    return parsed
+
+
+def _process_queries(context, queries, escape_format=None):
+    # Queries run after escaping, so the values they compare to are escaped too.
+    # Invalid queries are reported and skipped.
+    index = QueryIndex()
+    for route_str, query in queries.items():
+        try:
+            data, key = _get_data_from_route(context, _parse_route(str(route_str)))
+            base = data.get(key)
+        except (LookupError, AssertionError):
+            base = None
+        if not isinstance(base, list):
+            logging.error(f"Can not query '{route_str}', it is not a list")
+            continue
+
+        try:
+            if query is None:
+                query = {}
+            elif not isinstance(query, Mapping):
+                raise ValueError(f"expected a dict, got {query!r}")
+            query = copy.deepcopy(dict(query))
+            if escape_format in VALID_ESCAPE_FORMATS and isinstance(
+                query.get("where"), Mapping
+            ):
+                query["where"] = escape_strings(query["where"], escape_format)
+            data[str(query.get("as", key))] = QueryResult(base, query, index)
+        except ValueError as e:
+            logging.error(f"Invalid query '{route_str}': {e}")
 
 
 def preprocess_ctx_with_user_settings(context, user_config):
@@ -176,28 +263,15 @@ def preprocess_ctx_with_user_settings(context, user_config):
     _process_filters(context, user_config.get("filters", {}) or {})
 
 
-def generate(
-    template_folder: Path, output_folder: Path, user_config: dict, user_data: dict
-):
-    shutil.copytree(
-        template_folder,
-        output_folder,
-        dirs_exist_ok=True,
-        ignore=lambda _, names: [n for n in names if n.startswith(".git")],
-    )
-
-    config = load_template_config(str(template_folder / "config.yml"))
-    context = user_data
-
-    # Process files
-    overridable_files = config.get("overridable_files", {}) or {}
-    user_files = user_config.get("files", {}) or {}
-    process_files(
-        Path(user_config["static"]),
-        overridable_files,
-        output_folder,
-        user_files,
-    )
+def build_context(
+    template_folder: Path,
+    config: dict,
+    user_config: dict,
+    user_data: MutableMapping,
+) -> MutableMapping:
+    # The context is built over a copy, so the same user data can be rendered
+    # several times
+    context = copy.deepcopy(user_data)
 
     # Process overrides and filters
     preprocess_ctx_with_user_settings(context, user_config)
@@ -207,8 +281,11 @@ def generate(
     if escape_format is not None and escape_format in VALID_ESCAPE_FORMATS:
         context = escape_strings(context, escape_format)
 
+    # Process queries
+    _process_queries(context, user_config.get("queries", {}) or {}, escape_format)
+
     # Process settings
-    settings: dict = config.get("default_settings", {}) or {}
+    settings: dict = dict(config.get("default_settings", {}) or {})
     user_settings = user_config.get("settings", {}) or {}
     settings.update(user_settings)
     context["settings"] = settings
@@ -225,12 +302,186 @@ def generate(
         user_lang = default_lang
 
     context["intl"] = config.get("intl", {}).get(user_lang, {})
+    return context
+
+
+def render_recipe(
+    template_folder: Path,
+    user_config: dict,
+    user_data: MutableMapping,
+    config: dict | None = None,
+) -> dict[str, str | bytes]:
+    # Renders the recipe straight from the template folder into memory. The
+    # result maps every output path (relative to the output folder) that differs
+    # from the template to its content: rendered template files as str and user
+    # static files as bytes. Any pathlib-like object (e.g. zipfile.Path) can be
+    # used as template folder.
+    if config is None:
+        config = load_template_config(template_folder / "config.yml")
+
+    # Process files
+    overridable_files = config.get("overridable_files", {}) or {}
+    user_files = user_config.get("files", {}) or {}
+    outputs: dict[str, str | bytes] = {}
+    static_folder = user_config.get("static")
+    if user_files and static_folder is not None:
+        outputs.update(
+            collect_user_files(Path(static_folder), overridable_files, user_files)
+        )
+    elif user_files:
+        logging.error("No static folder given to fetch the user files from")
+
+    context = build_context(template_folder, config, user_config, user_data)
 
     for temp_file in config["template_files"]:
-        temp_file_path = output_folder / temp_file
+        temp_file = str(temp_file)
+        temp_file_path = template_folder / temp_file
+
+        # User files overriding a template file are rendered instead of it
+        if temp_file in outputs:
+            text = outputs[temp_file]
+            text = text.decode() if isinstance(text, bytes) else text
+        elif temp_file_path.exists():
+            text = temp_file_path.read_text()
+        else:
+            logging.error(
+                f"Template {template_folder.name} does not contains {temp_file}"
+            )
+            continue
+
+        outputs[temp_file] = render_template_text(
+            text, _path_name(temp_file_path, temp_file), context, config
+        )
+
+    return outputs
+
+
+def _unlink(path: Path):
+    # Files are replaced instead of overwritten so hard linked copies (shared
+    # assets, artifact store entries) are never modified
+    if os.path.lexists(path):
+        os.unlink(path)
+
+
+def link_or_copy(src: Path, dst: Path):
+    _unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
 
-        if not temp_file_path.exists():
-            logging.error(f"Template {template_folder} does not contains {temp_file}")
+
+def iter_template_assets(
+    template_folder: Path, skip: Iterable[str] = ()
+) -> Iterator[tuple[Path, Path]]:
+    # Yields the (relative path, source path) of every template file that is
+    # cooked as it is (but git files and the relative paths in 'skip')
+    skip_paths = {Path(s) for s in skip}
+    for folder, dirs, files in os.walk(template_folder):
+        dirs[:] = [d for d in dirs if not d.startswith(".git")]
+        rel_folder = Path(folder).relative_to(template_folder)
+        for name in files:
+            if name.startswith(".git") or rel_folder / name in skip_paths:
+                continue
+            yield rel_folder / name, Path(folder) / name
+
+
+def copy_template_assets(
+    template_folder: Path,
+    output_folder: Path,
+    skip: Iterable[str] = (),
+    staged_folder: Path | None = None,
+):
+    # When a staged folder (an output folder where the assets were already
+    # copied) is given, its assets are hard linked instead of copied again
+    created_folders = set()
+    for rel_path, src in iter_template_assets(template_folder, skip):
+        dst = output_folder / rel_path
+        if dst.parent not in created_folders:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            created_folders.add(dst.parent)
+        if staged_folder is None:
+            _unlink(dst)
+            shutil.copy2(src, dst)
+        else:
+            link_or_copy(staged_folder / rel_path, dst)
+
+
+def write_outputs(outputs: dict[str, str | bytes], output_folder: Path):
+    for rel_path, output in outputs.items():
+        dst_path = output_folder / rel_path
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        _unlink(dst_path)
+        if isinstance(output, bytes):
+            dst_path.write_bytes(output)
+        else:
+            dst_path.write_text(output)
+
+
+def hash_tree(hasher, folder: Path, skip: Container[str] = ()):
+    # Feeds the hasher with the relative path and content of every file in the
+    # folder (but git files and the relative paths in 'skip')
+    for file in sorted(folder.rglob("*")):
+        rel_path = file.relative_to(folder)
+        if any(p.startswith(".git") for p in rel_path.parts):
+            continue
+        if not file.is_file() or rel_path.as_posix() in skip:
             continue
+        hasher.update(f"{rel_path.as_posix()}\0".encode())
+        hasher.update(hashlib.sha256(file.read_bytes()).digest())
+
+
+def cook_digest(template_folder: Path, outputs: dict[str, str | bytes]) -> str:
+    # Identifies the content of a cooked folder: the template assets that are
+    # copied as they are plus the rendered outputs
+    hasher = hashlib.sha256()
+    hash_tree(hasher, template_folder, skip=outputs)
+    for rel_path in sorted(outputs):
+        output = outputs[rel_path]
+        hasher.update(f"{Path(rel_path).as_posix()}\0".encode())
+        hasher.update(
+            hashlib.sha256(
+                output if isinstance(output, bytes) else output.encode()
+            ).digest()
+        )
+    return hasher.hexdigest()
+
 
-        fill_template_file(temp_file_path, context, config)
+def generate(
+    template_folder: Path,
+    output_folder: Path,
+    user_config: dict,
+    user_data: MutableMapping,
+) -> dict[str, str | bytes]:
+    outputs = render_recipe(template_folder, user_config, user_data)
+    copy_template_assets(template_folder, output_folder, skip=outputs.keys())
+    write_outputs(outputs, output_folder)
+    return outputs
+
+
+def generate_many(
+    template_folder: Path,
+    cooks: Sequence[tuple[Path, MutableMapping]],
+    user_config: dict,
+    link_assets: bool = True,
+) -> list[dict[str, str | bytes]]:
+    # Cooks the same recipe for several (output folder, user data) pairs, e.g.
+    # one per language. The template config and compiled templates are shared
+    # and, when 'link_assets' is set, the template assets are copied only once
+    # and hard linked into the other output folders. Linked assets must not be
+    # edited in place, since the change would show in every output folder.
+    config = load_template_config(template_folder / "config.yml")
+    all_outputs = [
+        render_recipe(template_folder, user_config, user_data, config)
+        for _, user_data in cooks
+    ]
+
+    skip = set().union(*(outputs.keys() for outputs in all_outputs))
+    staged_folder = None
+    for (output_folder, _), outputs in zip(cooks, all_outputs):
+        copy_template_assets(template_folder, output_folder, skip, staged_folder)
+        write_outputs(outputs, output_folder)
+        if link_assets and staged_folder is None:
+            staged_folder = output_folder
+
+    return all_outputs
@@ -1,5 +1,7 @@
 import logging
 import os
+from collections.abc import MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Annotated, Optional
 
@@ -7,27 +9,77 @@ import typer
 
 import yuca.generation as gen
 from yuca.app_data import AppData
-from yuca.data.data_app import data_app
-from yuca.data_handlers import load_recipe, load_user_data_from_recipe
+from yuca.archive import ARCHIVE_SUFFIXES, archive_suffix, write_archive
+from yuca.cache.cache_app import cache_app
+from yuca.commands import parse_jobs, report, run_jobs
+from yuca.data.data_app import check_user_data, data_app
+from yuca.data_handlers import (
+    load_recipe,
+    load_template_config,
+    load_user_data,
+    load_user_data_from_recipe,
+)
+from yuca.store import (
+    ArtifactStore,
+    cook_key,
+    detach_from_store,
+    open_store,
+    template_digest,
+)
 from yuca.template.template_app import template_app
 from yuca.warehouse.warehouse_app import warehouse_app
 
+# Commands run in parallel by default, one per available core
+DEFAULT_JOBS = os.cpu_count() or 1
+
 app = typer.Typer()
 app.add_typer(warehouse_app, name="warehouse")
 app.add_typer(template_app, name="template")
 app.add_typer(data_app, name="data")
+app.add_typer(cache_app, name="cache")
+
 
+def _handle_cmds(
+    cmds: str | list,
+    cwd: Path | None = None,
+    jobs: int = 1,
+    timeout: float | None = None,
+    inputs_digest: str | None = None,
+) -> bool:
+    try:
+        cmd_jobs = parse_jobs(cmds, default_timeout=timeout)
+        results = run_jobs(
+            cmd_jobs, cwd=cwd, max_workers=jobs, inputs_digest=inputs_digest
+        )
+    except ValueError as e:
+        logging.error(f"Invalid commands: {e}")
+        return False
+    return report(results)
 
-def _run_cmd(cmd):
-    print(f"> {cmd}")
-    os.system(cmd)
 
+def _storable_cmds(recipe_data: dict) -> bool:
+    # Cooks are only stored if every post cook command declares its 'outputs',
+    # a stored cook would miss the files of any other command
+    try:
+        jobs = parse_jobs(recipe_data.get("post_cook", []) or [])
+    except ValueError:
+        return False
+    return all(job.outputs for job in jobs)
 
-def _handle_cmds(cmds: str | list[str]):
-    if isinstance(cmds, str):
-        cmds = [cmds]
-    for c in cmds:
-        _run_cmd(c)
+
+def _cooked_files(
+    template_folder: Path, outputs: dict[str, str | bytes], post_cook: str | list
+) -> list[str]:
+    # Files produced by a cook: the template assets, the rendered outputs and
+    # the declared outputs of the post cook commands. Any other file in the
+    # output folder (e.g. left by previous cooks) is not part of the cook.
+    files = {
+        rel_path.as_posix()
+        for rel_path, _ in gen.iter_template_assets(template_folder, outputs.keys())
+    }
+    files.update(Path(rel_path).as_posix() for rel_path in outputs)
+    files.update(out for job in parse_jobs(post_cook) for out in job.outputs)
+    return sorted(files)
 
 
 def _resolve_recipe_path(recipe: str) -> str | None:
@@ -43,12 +95,111 @@ def _resolve_recipe_path(recipe: str) -> str | None:
     return None
 
 
+def _resolve_langs(langs: str, template_folder: Path) -> list[str]:
+    config = load_template_config(str(template_folder / "config.yml"))
+    available = [str(lang) for lang in (config.get("intl", {}) or {})]
+    if langs == "all":
+        return available
+
+    selected = []
+    for lang in (lang.strip() for lang in langs.split(",")):
+        if lang not in available:
+            logging.warning(
+                f"Template '{template_folder.name}' doesn't support '{lang}' language"
+            )
+            continue
+        selected.append(lang)
+    return selected
+
+
+def _resolve_lang_data(data_folder: Path, lang: str) -> tuple[str, dict] | None:
+    # The data file of a language is the one named after it (e.g. 'es.yml') or,
+    # otherwise, any data file whose 'lang' is the given one
+    lang_file = data_folder / f"{lang}.yml"
+    if lang_file.exists():
+        return str(lang_file), load_user_data(str(lang_file))
+    for file in sorted(data_folder.glob("*.yml")):
+        data = load_user_data(str(file))
+        if data.get("lang") == lang:
+            return str(file), data
+    return None
+
+
+def _lang_archive_path(archive: Path, lang: str) -> Path:
+    # e.g. 'resume.tar.gz' -> 'resume-es.tar.gz'
+    suffix = archive_suffix(archive) or ""
+    return archive.with_name(f"{archive.name[: -len(suffix)]}-{lang}{suffix}")
+
+
+def _cook_archives(
+    template_folder: Path,
+    cooks: Sequence[tuple[Path, MutableMapping]],
+    gen_config: dict,
+):
+    # Archives are always rendered (never taken from the artifact store), so
+    # their content only depends on the cook inputs
+    config = load_template_config(str(template_folder / "config.yml"))
+    for archive_path, user_data in cooks:
+        outputs = gen.render_recipe(template_folder, gen_config, user_data, config)
+        assets = gen.iter_template_assets(template_folder, skip=outputs.keys())
+        try:
+            write_archive(archive_path, assets, outputs)
+        except (ValueError, OSError) as e:
+            logging.error(f"Unable to write '{archive_path}': {e}")
+            raise typer.Exit(code=1)
+        logging.info(f"Cooked '{archive_path}'")
+
+
 @app.command(name="cook")
 def generate(
     recipe: str,
     output: Annotated[
         Optional[str], typer.Option("--output", "-o", help="Output folder")
     ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option(
+            "--jobs", "-j", help="Maximum number of cook commands run in parallel"
+        ),
+    ] = DEFAULT_JOBS,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            help="Reuse the outputs of post cook commands when the cooked files "
+            "did not change"
+        ),
+    ] = True,
+    langs: Annotated[
+        Optional[str],
+        typer.Option(
+            help="Cook the recipe for several languages of the template at once: "
+            "'all' or a comma separated list (e.g. 'en,es'). Every language is "
+            "cooked into '[output]-[lang]' using the data file of that language"
+        ),
+    ] = None,
+    store: Annotated[
+        bool,
+        typer.Option(
+            help="Reuse (and save) cooked results from the artifact store when "
+            "the template, recipe, data and static files did not change"
+        ),
+    ] = True,
+    store_location: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="YUCA_STORE",
+            help="Artifact store location: a folder (e.g. in a network mount) or "
+            "an http(s) url. Defaults to the yuca cache folder",
+        ),
+    ] = None,
+    archive: Annotated[
+        Optional[str],
+        typer.Option(
+            help="Cook straight into an archive (e.g. 'resume.zip' or "
+            "'resume.tar.zst') instead of an output folder. Post cook commands "
+            "are not run and the artifact store is not used",
+        ),
+    ] = None,
 ):
     recipe_path = _resolve_recipe_path(recipe)
 
@@ -71,26 +222,146 @@ def generate(
         )
         return
 
+    if archive is not None and archive_suffix(Path(archive)) is None:
+        logging.error(
+            f"Invalid archive '{archive}', valid formats: {', '.join(ARCHIVE_SUFFIXES)}"
+        )
+        raise typer.Exit(code=1)
+
     if output is None:
         output = f"./{Path(recipe_path).stem}-cooked"
 
-    output_folder = Path(output)
-    output_folder.mkdir(parents=True, exist_ok=True)
-
-    _handle_cmds(recipe_data.get("pre_cook", []) or [])
+    cmd_timeout = recipe_data.get("cmd_timeout")
+    if not _handle_cmds(
+        recipe_data.get("pre_cook", []) or [], jobs=jobs, timeout=cmd_timeout
+    ):
+        logging.error("Pre cook commands failed, aborting")
+        raise typer.Exit(code=1)
 
     recipe_data["user_data"] = str(
         (wh_folder / "data" / recipe_data["user_data"]).absolute().resolve()
     )
-    user_data = load_user_data_from_recipe(recipe_data)
 
+    static_folder = (wh_folder / "static").absolute().resolve()
     gen_config = recipe_data.get("gen_config", {}) or {}
-    gen_config["static"] = str((wh_folder / "static").absolute().resolve())
+    gen_config["static"] = str(static_folder)
+
+    if langs is None:
+        data_files = [
+            (
+                Path(output) if archive is None else Path(archive),
+                recipe_data["user_data"],
+                load_user_data_from_recipe(recipe_data),
+            )
+        ]
+    else:
+        data_files = []
+        for lang in _resolve_langs(langs, template_folder):
+            lang_data = _resolve_lang_data(wh_folder / "data", lang)
+            if lang_data is None:
+                logging.error(f"No data file found for '{lang}' language, skipping it")
+                continue
+            target = (
+                Path(f"{output}-{lang}")
+                if archive is None
+                else _lang_archive_path(Path(archive), lang)
+            )
+            data_files.append((target, *lang_data))
+        if not data_files:
+            logging.error(f"No language to cook found in '{langs}'")
+            raise typer.Exit(code=1)
+
+    # Validate the data before doing any work, cooking uses the typed records
+    # built by the validation
+    cooks = []
+    for output_folder, data_file, user_data in data_files:
+        record = check_user_data(user_data, data_file)
+        if record is None:
+            logging.error("Invalid user data, aborting")
+            raise typer.Exit(code=1)
+        cooks.append((output_folder, record))
+
+    if archive is not None:
+        if recipe_data.get("post_cook"):
+            logging.warning("Post cook commands are not run when cooking archives")
+        _cook_archives(template_folder, cooks, gen_config)
+        return
+
+    artifact_store = open_store(store_location) if store else None
+    if artifact_store is not None and not _storable_cmds(recipe_data):
+        logging.info(
+            "Post cook commands without 'outputs' can not be stored, the artifact "
+            "store is not used"
+        )
+        artifact_store = None
+    store_keys: dict[Path, str] = {}
+    if artifact_store is not None:
+        tmpl_digest = template_digest(template_folder)
+        for target, user_data in cooks:
+            store_keys[target] = cook_key(
+                tmpl_digest, recipe_data, user_data, static_folder
+            )
+
+    # Check the artifact store before cooking
+    pending = []
+    for output_folder, user_data in cooks:
+        output_folder.mkdir(parents=True, exist_ok=True)
+        if artifact_store is not None and artifact_store.materialize(
+            store_keys[output_folder], output_folder
+        ):
+            logging.info(f"Using cooked '{output_folder}' from the artifact store")
+            continue
+        detach_from_store(output_folder)
+        pending.append((output_folder, user_data))
+
+    if not pending:
+        return
+
+    if len(pending) == 1:
+        output_folder, user_data = pending[0]
+        all_outputs = [
+            gen.generate(template_folder, output_folder, gen_config, user_data)
+        ]
+    else:
+        # Post cook commands may edit the cooked files in place, so the assets
+        # are only shared between the output folders when there are none
+        all_outputs = gen.generate_many(
+            template_folder,
+            pending,
+            gen_config,
+            link_assets=not recipe_data.get("post_cook"),
+        )
 
-    gen.generate(template_folder, output_folder, gen_config, user_data)
+    # The post cook commands of every language run at the same time, sharing
+    # the '--jobs' budget
+    post_cook = recipe_data.get("post_cook", []) or []
+    lang_workers = max(1, min(jobs, len(pending)))
+    with ThreadPoolExecutor(max_workers=lang_workers) as executor:
+        futures = [
+            executor.submit(
+                _handle_cmds,
+                post_cook,
+                cwd=output_folder,
+                jobs=max(1, jobs // lang_workers),
+                timeout=cmd_timeout,
+                inputs_digest=(
+                    gen.cook_digest(template_folder, outputs) if cache else None
+                ),
+            )
+            for (output_folder, _), outputs in zip(pending, all_outputs)
+        ]
+        succeeded = [future.result() for future in futures]
 
-    os.chdir(output_folder)
-    _handle_cmds(recipe_data.get("post_cook", []) or [])
+    for (output_folder, _), outputs, ok in zip(pending, all_outputs, succeeded):
+        if ok and artifact_store is not None:
+            artifact_store.put(
+                store_keys[output_folder],
+                output_folder,
+                _cooked_files(template_folder, outputs, post_cook),
+            )
+    if not all(succeeded):
+        logging.error("Post cook commands failed")
+        raise typer.Exit(code=1)
 
 
 def main():
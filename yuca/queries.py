@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import operator
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, NamedTuple
+
+# Declarative queries over the lists of the user data, given in the recipe
+# gen_config. For example:
+#
+#   queries:
+#     publications:
+#       where:
+#         year: {">=": 2018}
+#       sort: [-citations, title]
+#       limit: 20
+#       group_by: year        # optional
+#       as: top_publications  # optional, the list is replaced otherwise
+#
+# Results are lazy sequences: they are only evaluated when a template uses them.
+
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda val, ref: val in ref,
+    "not in": lambda val, ref: val not in ref,
+    "contains": lambda val, ref: ref in val,
+}
+
+
+class Group(NamedTuple):
+    # Same shape as the groups of the jinja 'groupby' filter
+    grouper: Any
+    list: list
+
+
+def get_field(item: Any, field: str) -> Any:
+    for key in field.split("."):
+        if not isinstance(item, Mapping):
+            return None
+        item = item.get(key)
+    return item
+
+
+def _sort_value(value: Any) -> tuple:
+    # Numbers sort before any other value, which is compared as text
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+def _compile_condition(field: str, cond: Any) -> Callable[[Any], bool]:
+    if not isinstance(cond, Mapping):
+        cond = {"==": cond}
+
+    checks = []
+    for op_name, ref in cond.items():
+        if op_name not in OPERATORS:
+            raise ValueError(f"Unknown query operator '{op_name}' for '{field}'")
+        checks.append((OPERATORS[op_name], ref))
+
+    def check(item):
+        value = get_field(item, field)
+        if value is None:
+            return False
+        try:
+            return all(op(value, ref) for op, ref in checks)
+        except TypeError:
+            return False
+
+    return check
+
+
+def compile_where(where: Mapping | None) -> Callable[[Any], bool] | None:
+    if not where:
+        return None
+    if not isinstance(where, Mapping):
+        raise ValueError(f"'where' must be a dict of conditions, got {where!r}")
+    conditions = [_compile_condition(str(f), c) for f, c in where.items()]
+    if len(conditions) == 1:
+        return conditions[0]
+    return lambda item: all(cond(item) for cond in conditions)
+
+
+class QueryIndex:
+    # Sort indexes computed once per list and sort key, shared by all the
+    # queries over the same data
+
+    def __init__(self):
+        self._ranks: dict[tuple[int, str, bool], list[int]] = {}
+        self._orders: dict[tuple[int, tuple], list[int]] = {}
+        # Keeps the indexed lists alive, so their ids are not reused
+        self._lists: dict[int, list] = {}
+
+    def _dense_ranks(self, base: list, field: str, descending: bool) -> list[int]:
+        # Position of the value of every item in the sort order. Equal values
+        # share the rank and missing values always go last.
+        cache_key = (id(base), field, descending)
+        if cache_key in self._ranks:
+            return self._ranks[cache_key]
+
+        values = [get_field(item, field) for item in base]
+        present = [i for i, v in enumerate(values) if v is not None]
+        present.sort(key=lambda i: _sort_value(values[i]), reverse=descending)
+
+        ranks = [len(present)] * len(base)
+        rank, prev = -1, object()
+        for i in present:
+            value = _sort_value(values[i])
+            if value != prev:
+                rank, prev = rank + 1, value
+            ranks[i] = rank
+
+        self._lists[id(base)] = base
+        self._ranks[cache_key] = ranks
+        return ranks
+
+    def order(self, base: list, sort: tuple[str, ...]) -> list[int] | range:
+        if not sort:
+            return range(len(base))
+        cache_key = (id(base), sort)
+        if cache_key not in self._orders:
+            ranks = [
+                self._dense_ranks(base, key.lstrip("-"), key.startswith("-"))
+                for key in sort
+            ]
+            if len(ranks) == 1:
+                order = sorted(range(len(base)), key=ranks[0].__getitem__)
+            else:
+                order = sorted(range(len(base)), key=lambda i: [r[i] for r in ranks])
+            self._orders[cache_key] = order
+        return self._orders[cache_key]
+
+
+class QueryResult(Sequence):
+    # Lazy, already sliced view of a list selected by a query
+
+    def __init__(self, base: list, query: Mapping, index: QueryIndex):
+        sort = query.get("sort", []) or []
+        if not isinstance(sort, (str, list)):
+            raise ValueError(
+                f"'sort' must be a field or a list of fields, got {sort!r}"
+            )
+        self._base = base
+        self._index = index
+        self._sort = (sort,) if isinstance(sort, str) else tuple(map(str, sort))
+        self._where = compile_where(query.get("where"))
+        limit = query.get("limit")
+        try:
+            self._offset = int(query.get("offset", 0) or 0)
+            self._limit = None if limit is None else int(limit)
+        except (TypeError, ValueError):
+            raise ValueError("'limit' and 'offset' must be integers") from None
+        group_by = query.get("group_by")
+        self._group_by = None if group_by is None else str(group_by)
+        self._items: list | None = None
+
+    def _evaluate(self) -> list:
+        # Walks the precomputed sort order and stops as soon as the limit is
+        # reached, so only the needed items are tested
+        selected: list = []
+        skipped = 0
+        if self._limit is not None and self._limit <= 0:
+            return selected
+        for i in self._index.order(self._base, self._sort):
+            item = self._base[i]
+            if self._where is not None and not self._where(item):
+                continue
+            if skipped < self._offset:
+                skipped += 1
+                continue
+            selected.append(item)
+            if self._limit is not None and len(selected) >= self._limit:
+                break
+
+        if self._group_by is None:
+            return selected
+
+        groups: dict[Any, list] = {}
+        for item in selected:
+            groups.setdefault(get_field(item, self._group_by), []).append(item)
+        return [Group(key, items) for key, items in groups.items()]
+
+    @property
+    def items(self) -> list:
+        if self._items is None:
+            self._items = self._evaluate()
+        return self._items
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __repr__(self):
+        return f"QueryResult({self.items!r})"
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import stat
+import tarfile
+import time
+import uuid
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+
+import platformdirs
+import requests
+
+from yuca import __version__
+from yuca.app_data import APP_NAME
+from yuca.generation import hash_tree, link_or_copy
+
+# File written in the cooked folders materialized from the store. It lists the
+# files hard linked to the store, so they can be detached before cooking again
+MANIFEST_FILE = ".yuca-store"
+
+# Write permission bits removed from the stored files
+READ_ONLY_MASK = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+
+def default_store_dir() -> Path:
+    return Path(platformdirs.user_cache_dir(APP_NAME)) / "store"
+
+
+def _canonical(data):
+    # YAML mappings can mix keys of several types (e.g. years and names), which
+    # can not be sorted, so every key is hashed as text
+    if isinstance(data, Mapping):
+        return {str(k): _canonical(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_canonical(v) for v in data]
+    return data
+
+
+def _hash_data(hasher, data):
+    hasher.update(json.dumps(_canonical(data), sort_keys=True, default=str).encode())
+    hasher.update(b"\0")
+
+
+def template_digest(template_folder: Path) -> str:
+    hasher = hashlib.sha256()
+    hash_tree(hasher, template_folder)
+    return hasher.hexdigest()
+
+
+def cook_key(
+    template_digest: str,
+    recipe: dict,
+    user_data: Mapping,
+    static_folder: Path,
+) -> str:
+    # Identifies a cook by its inputs: the template tree, the recipe, the
+    # resolved user data and the static files used by the recipe
+    hasher = hashlib.sha256(f"yuca-{__version__}\0{template_digest}\0".encode())
+
+    # Absolute paths resolved while cooking are not part of the key, so it is
+    # the same in every machine
+    gen_config = recipe.get("gen_config", {}) or {}
+    recipe = {k: v for k, v in recipe.items() if k != "user_data"}
+    recipe["gen_config"] = {k: v for k, v in gen_config.items() if k != "static"}
+    _hash_data(hasher, recipe)
+    _hash_data(hasher, user_data)
+
+    for key, user_file in sorted((gen_config.get("files", {}) or {}).items()):
+        static_file = static_folder / user_file
+        hasher.update(f"{key}\0{user_file}\0".encode())
+        if static_file.is_file():
+            hasher.update(hashlib.sha256(static_file.read_bytes()).digest())
+    return hasher.hexdigest()
+
+
+def detach_from_store(output_folder: Path):
+    # Removes the files of a previous cook materialized from the store, so the
+    # new cook does not write through the hard links into the store
+    manifest = output_folder / MANIFEST_FILE
+    if not manifest.exists():
+        return
+    for rel_path in manifest.read_text().splitlines():
+        file = output_folder / rel_path
+        if rel_path and file.is_file():
+            file.unlink()
+    manifest.unlink()
+
+
+def _extract_all(tar: tarfile.TarFile, folder: Path):
+    # Entries come from a remote server, so only regular files and folders
+    # inside the target folder are extracted. The 'data' filter does that (and
+    # more) but is only available since python 3.10.12.
+    if hasattr(tarfile, "data_filter"):
+        tar.extractall(folder, filter="data")
+        return
+    root = folder.resolve()
+    for member in tar.getmembers():
+        target = (folder / member.name).resolve()
+        if not (member.isfile() or member.isdir()) or not target.is_relative_to(root):
+            raise tarfile.TarError(f"Unsafe entry '{member.name}' in stored artifact")
+    tar.extractall(folder)
+
+
+def _remove_other_files(folder: Path, keep: set[Path]):
+    # Removes the files left in the folder by previous cooks (but git files),
+    # so a materialized folder only holds the files of the stored cook
+    for file in list(folder.rglob("*")):
+        rel_path = file.relative_to(folder)
+        if any(p.startswith(".git") for p in rel_path.parts):
+            continue
+        if (file.is_file() or file.is_symlink()) and rel_path not in keep:
+            file.unlink()
+
+
+def prune_entries(folder: Path, max_age: float | None = None) -> int:
+    # Removes the entries (sub folders) of a cache folder not used in the last
+    # 'max_age' seconds, or all of them. Returns the number of removed entries.
+    if not folder.is_dir():
+        return 0
+    now = time.time()
+    removed = 0
+    for entry in folder.iterdir():
+        if not entry.is_dir():
+            continue
+        if max_age is not None and now - entry.stat().st_mtime < max_age:
+            continue
+        shutil.rmtree(entry, onerror=_make_writable)
+        removed += 1
+    return removed
+
+
+def _make_writable(func, path, _):
+    # Stored files are read only, which prevents removing them on windows
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+class ArtifactStore:
+    # Content addressed store of cooked folders in a local directory (which can
+    # be a network mount shared between several users or CI runners)
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def has(self, key: str) -> bool:
+        return self._entry(key).is_dir()
+
+    def get(self, key: str) -> Path | None:
+        # Folder of the stored entry (read only), if any
+        return self._entry(key) if self.has(key) else None
+
+    def prune(self, max_age: float | None = None) -> int:
+        # Removes the entries not used in the last 'max_age' seconds (all of
+        # them if not given). Returns the number of removed entries.
+        if not self.root.is_dir():
+            return 0
+        removed = 0
+        for folder in self.root.iterdir():
+            if not folder.is_dir():
+                continue
+            removed += prune_entries(folder, max_age)
+            if not any(folder.iterdir()):
+                folder.rmdir()
+        return removed
+
+    def materialize(self, key: str, output_folder: Path) -> bool:
+        entry = self._entry(key)
+        if not entry.is_dir():
+            return False
+
+        detach_from_store(output_folder)
+        entry_files = {
+            file.relative_to(entry) for file in entry.rglob("*") if file.is_file()
+        }
+        _remove_other_files(output_folder, entry_files)
+
+        # The entry is marked as used, so it is kept when pruning old entries
+        os.utime(entry)
+        linked = []
+        for folder, _, files in os.walk(entry):
+            rel_folder = Path(folder).relative_to(entry)
+            (output_folder / rel_folder).mkdir(parents=True, exist_ok=True)
+            for name in files:
+                link_or_copy(Path(folder) / name, output_folder / rel_folder / name)
+                linked.append((rel_folder / name).as_posix())
+        (output_folder / MANIFEST_FILE).write_text("\n".join(linked))
+        return True
+
+    def put(self, key: str, folder: Path, files: Iterable[str] | None = None):
+        # Stores the given files (relative paths) of a cooked folder, every file
+        # in the folder if none are given. Stored files are read only, so the
+        # hard links materialized from them can not be edited in place.
+        entry = self._entry(key)
+        if entry.is_dir():
+            return
+        if files is None:
+            files = (
+                file.relative_to(folder).as_posix()
+                for file in folder.rglob("*")
+                if file.name != MANIFEST_FILE
+            )
+
+        # Files are copied into a temporary entry that is renamed at the end, so
+        # concurrent cooks never see incomplete entries
+        tmp_entry = entry.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        tmp_entry.mkdir(parents=True)
+        for rel_path in files:
+            src = folder / rel_path
+            if not src.is_file():
+                continue
+            dst = tmp_entry / rel_path
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dst)
+            os.chmod(dst, stat.S_IMODE(dst.stat().st_mode) & ~READ_ONLY_MASK)
+        try:
+            tmp_entry.rename(entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+
+class HttpArtifactStore(ArtifactStore):
+    # Store backed by an HTTP server accepting GET and PUT of '[url]/[key].tar'
+    # files. Downloaded entries are kept in a local store.
+
+    def __init__(self, url: str, root: Path):
+        super().__init__(root)
+        self.url = url.rstrip("/")
+
+    def _fetch(self, key: str) -> bool:
+        try:
+            response = requests.get(f"{self.url}/{key}.tar", timeout=60)
+        except requests.RequestException as e:
+            logging.warning(f"Unable to reach the artifact store: {e}")
+            return False
+        if response.status_code != 200:
+            return False
+
+        tmp_folder = self.root / f"{key}.{uuid.uuid4().hex}.download"
+        with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+            _extract_all(tar, tmp_folder)
+        super().put(key, tmp_folder)
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        return True
+
+    def has(self, key: str) -> bool:
+        return super().has(key) or self._fetch(key)
+
+    def materialize(self, key: str, output_folder: Path) -> bool:
+        return self.has(key) and super().materialize(key, output_folder)
+
+    def put(self, key: str, folder: Path, files: Iterable[str] | None = None):
+        super().put(key, folder, files)
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            tar.add(self._entry(key), arcname=".")
+        try:
+            response = requests.put(
+                f"{self.url}/{key}.tar", data=buffer.getvalue(), timeout=60
+            )
+        except requests.RequestException as e:
+            logging.warning(f"Unable to upload to the artifact store: {e}")
+            return
+        if not response.ok:
+            logging.warning(
+                f"Unable to upload to the artifact store: {response.status_code}"
+            )
+
+
+def open_store(location: str | None = None) -> ArtifactStore:
+    if location is not None and location.startswith(("http://", "https://")):
+        return HttpArtifactStore(location, default_store_dir())
+    root = default_store_dir() if location is None else Path(location)
+    return ArtifactStore(root)